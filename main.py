@@ -6,73 +6,192 @@ Writes changed=true|false to GITHUB_OUTPUT for use in conditional steps.
 import os
 import subprocess
 import sys
+from collections.abc import Mapping
 
 
-def get_input(name: str, default: str | None = None, *, required: bool = False) -> str:
+def get_input(
+    name: str,
+    default: str | None = None,
+    *,
+    required: bool = False,
+    env: Mapping[str, str] | None = None,
+) -> str:
     key = f"INPUT_{name.upper()}"
-    val = os.environ.get(key)
+    val = (os.environ if env is None else env).get(key)
     if val is None or val == "":
         if required and default is None:
             raise ValueError(f"Missing required input: {name} (env {key})")
         return default or ""
     return val
 
-def _ensure_commit_exists(workspace: str, sha: str) -> None:
-    """Fetch a specific commit SHA if it doesn't exist locally."""
-    # Vérifie si le commit existe
-    r = subprocess.run(["git", "cat-file", "-t", sha], cwd=workspace,
-                       capture_output=True, text=True)
-    if r.returncode != 0:
+def _ensure_safe_directory(workspace: str, env: Mapping[str, str] | None = None) -> None:
+    """Add workspace to safe.directory in the global git config unless it is already there.
+
+    Best effort, like the git config call it replaces: failures never stop the action.
+    """
+    env = os.environ if env is None else env
+    config_path = env.get("GIT_CONFIG_GLOBAL") or os.path.expanduser("~/.gitconfig")
+    if any(c in workspace for c in '"\\;#\n') or workspace != workspace.strip():
+        # Value would need quoting: let git write it
+        _add_safe_directory_with_git(workspace)
+        return
+
+    try:
+        with open(config_path, encoding="utf-8") as f:
+            content = f.read()
+    except FileNotFoundError:
+        content = ""
+    except OSError:
+        _add_safe_directory_with_git(workspace)
+        return
+
+    # The file format is INI-like: look for "directory = <workspace>" (or "*") under [safe].
+    # An empty "directory =" resets the list, so only entries after the last reset count.
+    found = False
+    section = ""
+    for line in content.splitlines():
+        line = line.strip()
+        if line.startswith("["):
+            section = line.strip("[]").strip().lower()
+        elif section == "safe" and "=" in line:
+            key, value = (part.strip() for part in line.split("=", 1))
+            if key.lower() != "directory":
+                continue
+            if not value:
+                found = False
+            elif value in (workspace, "*"):
+                found = True
+    if found:
+        return
+
+    try:
+        with open(config_path, "a", encoding="utf-8") as f:
+            if content and not content.endswith("\n"):
+                f.write("\n")
+            f.write(f"[safe]\n\tdirectory = {workspace}\n")
+    except OSError:
+        _add_safe_directory_with_git(workspace)
+
+
+def _add_safe_directory_with_git(workspace: str) -> None:
+    subprocess.run(
+        ["git", "config", "--global", "--add", "safe.directory", workspace],
+        cwd=workspace,
+        check=False,
+        capture_output=True,
+    )
+
+
+def _ensure_commits_exist(workspace: str, shas: list[str]) -> None:
+    """Fetch the given commit SHAs that don't exist locally."""
+    # Guard for direct callers passing the same SHA twice: main() already returns early when before == after
+    shas = list(dict.fromkeys(shas))
+    # One git cat-file process checks every SHA; missing objects are reported as "<sha> missing"
+    r = subprocess.run(
+        ["git", "cat-file", "--batch-check=%(objectname) %(objecttype)"],
+        cwd=workspace,
+        input="".join(f"{sha}\n" for sha in shas),
+        capture_output=True,
+        text=True,
+    )
+    lines = r.stdout.splitlines() if r.returncode == 0 else []
+    for i, sha in enumerate(shas):
+        if i < len(lines) and not lines[i].endswith(" missing"):
+            continue
         # Commit absent → fetch explicite
-        subprocess.run(
-            ["git", "fetch", "--no-tags", "--depth=1", "origin", sha],
+        _fetch_commit(workspace, sha)
+
+
+def _fetch_commit(workspace: str, ref: str) -> None:
+    """Fetch only what is needed to resolve ref, never the other branches."""
+    if _is_relative_ref(ref):
+        # e.g. HEAD~1: deepen the history of the checked-out commit
+        head = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
             cwd=workspace,
-            check=True
-        )
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        args = [f"--depth={RELATIVE_REF_DEPTH}", "origin", head]
+    else:
+        args = ["--depth=1", "origin", ref]
+    # Only commits and trees are ever read, so leave the blobs on the server
+    subprocess.run(
+        ["git", "fetch", "--no-tags", "--filter=blob:none", *args],
+        cwd=workspace,
+        check=True
+    )
 
 
+def _is_relative_ref(ref: str) -> bool:
+    """True for anything that is not a full commit SHA (e.g. HEAD~1, a branch name)."""
+    if len(ref) != 40:
+        return True
+    # bytes.fromhex validates in C; it skips whitespace, which the length check catches
+    try:
+        return len(bytes.fromhex(ref)) != 20
+    except ValueError:
+        return True
+
+
+# History fetched below HEAD when a relative ref (e.g. HEAD~1) is missing locally
+RELATIVE_REF_DEPTH = 50
+
 # All-zero object hash means no previous ref (e.g. first push, force-push)
 INVALID_BEFORE = "0" * 40
 
 def main() -> None:
+    env = os.environ
     try:
-        path = get_input("path", required=True).strip()
+        path = get_input("path", required=True, env=env).strip()
     except ValueError as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
+    # Normalize path: no trailing slash for consistent comparison
+    path = path.rstrip("/")
+    if not path:
+        # "/" would become an empty pathspec, which git rejects
+        print("Error: Invalid input: path must name a file or directory in the repository, not '/'", file=sys.stderr)
+        sys.exit(1)
+
     # No default for before in code: action.yml default (HEAD~1) is passed by the runner when omitted
-    before = get_input("before", required=True).strip()
-    after = get_input("after", required=True).strip()
-    github_output = os.environ.get("GITHUB_OUTPUT")
+    before = get_input("before", required=True, env=env).strip()
+    after = get_input("after", required=True, env=env).strip()
+    github_output = env.get("GITHUB_OUTPUT")
     if not github_output:
         print("GITHUB_OUTPUT is not set", file=sys.stderr)
         sys.exit(1)
 
-    workspace = os.environ.get("GITHUB_WORKSPACE")
+    # Answers that need no git at all
+    if before == INVALID_BEFORE:
+        _write_output(github_output, "true")
+        return
+    if before == after:
+        _write_output(github_output, "false")
+        return
+
+    workspace = env.get("GITHUB_WORKSPACE")
     if not workspace or not os.path.isdir(workspace):
         print("GITHUB_WORKSPACE is not set or not a directory", file=sys.stderr)
         sys.exit(1)
 
     # In Docker/CI the repo may be owned by another user; allow this directory (Git 2.35.2+).
-    subprocess.run(
-        ["git", "config", "--global", "--add", "safe.directory", workspace],
-        cwd=workspace,
-        check=False,
-        capture_output=True,
-    )
-
-    # Normalize path: no trailing slash for consistent comparison
-    path = path.rstrip("/")
+    _ensure_safe_directory(workspace, env)
 
-    _ensure_commit_exists(workspace, before)
-    _ensure_commit_exists(workspace, after)
+    _ensure_commits_exist(workspace, [before, after])
 
+    # Let git filter by pathspec: the exit code is 1 if anything under path changed, 0 otherwise,
+    # so there is no stdout to capture or parse. stderr is inherited: git reports errors itself.
+    # Literal pathspecs so that glob characters in path are not interpreted, and no rename
+    # detection: a renamed file shows up under its old and new names anyway.
     try:
         result = subprocess.run(
-            ["git", "diff", "--name-only", before, after],
-            capture_output=True,
-            text=True,
+            [
+                "git", "--literal-pathspecs", "diff", "--quiet", "--exit-code", "--no-renames",
+                before, after, "--", path,
+            ],
             check=False,
             cwd=workspace,
         )
@@ -80,26 +199,25 @@ def main() -> None:
         print("git not found", file=sys.stderr)
         sys.exit(1)
 
-    if result.returncode != 0:
-        print(f"Error(git diff): {result.stderr or 'git diff failed'}", file=sys.stderr)
+    if result.returncode not in (0, 1):
+        print(f"Error(git diff): git diff failed with exit code {result.returncode}", file=sys.stderr)
         sys.exit(1)
 
-    changed = "false"
-    for line in (result.stdout or "").splitlines():
-        name = line.strip()
-        if not name:
-            continue
-        # Match: path exactly or path/...
-        if name == path or name.startswith(path + "/"):
-            changed = "true"
-            break
+    changed = "true" if result.returncode == 1 else "false"
 
     _write_output(github_output, changed)
 
 
+# Preformatted output lines, written with a single write(2)
+_OUTPUT_LINES = {"true": b"changed=true\n", "false": b"changed=false\n"}
+
+
 def _write_output(github_output_path: str, value: str) -> None:
-    with open(github_output_path, "a", encoding="utf-8") as f:
-        f.write(f"changed={value}\n")
+    fd = os.open(github_output_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, _OUTPUT_LINES[value])
+    finally:
+        os.close(fd)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 """Tests for main.py (Check path changes action)."""
 import os
+import subprocess
 import sys
 from pathlib import Path
 from unittest.mock import patch, MagicMock
@@ -11,6 +12,30 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 import main as main_module
 
 
+@pytest.fixture
+def git_repo(tmp_path):
+    """Real repository with two commits: mon-dossier/foo.txt modified, other/bar.txt untouched."""
+    repo = tmp_path / "repo"
+    (repo / "mon-dossier").mkdir(parents=True)
+    (repo / "other").mkdir()
+
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True, text=True).stdout.strip()
+
+    git("init", "-q")
+    git("config", "user.email", "test@example.com")
+    git("config", "user.name", "test")
+    (repo / "mon-dossier" / "foo.txt").write_text("1\n")
+    (repo / "other" / "bar.txt").write_text("1\n")
+    git("add", "-A")
+    git("commit", "-q", "-m", "first")
+    before = git("rev-parse", "HEAD")
+    (repo / "mon-dossier" / "foo.txt").write_text("2\n")
+    git("commit", "-q", "-am", "second")
+    after = git("rev-parse", "HEAD")
+    return str(repo), before, after
+
+
 @pytest.fixture
 def github_output_file(tmp_path):
     """Temporary file used as GITHUB_OUTPUT."""
@@ -28,6 +53,7 @@ def minimal_env(github_output_file):
         "INPUT_AFTER": "def456",
         "GITHUB_OUTPUT": github_output_file,
         "GITHUB_WORKSPACE": workspace,
+        "GIT_CONFIG_GLOBAL": str(Path(workspace) / "gitconfig"),
     }
 
 
@@ -42,6 +68,15 @@ def read_output(path: str) -> str:
     return ""
 
 
+def test_get_input_reads_given_env():
+    """get_input looks up INPUT_<NAME> in the given mapping instead of os.environ."""
+    env = {"INPUT_PATH": "mon-dossier", "INPUT_BEFORE": ""}
+    assert main_module.get_input("path", env=env) == "mon-dossier"
+    assert main_module.get_input("before", "HEAD~1", env=env) == "HEAD~1"
+    with pytest.raises(ValueError):
+        main_module.get_input("after", required=True, env=env)
+
+
 def test_missing_input_path_exits_with_error(github_output_file, capfd):
     """INPUT_PATH empty or missing -> exit 1 and error on stderr."""
     env = {
@@ -56,6 +91,21 @@ def test_missing_input_path_exits_with_error(github_output_file, capfd):
     assert "Missing required input: path (env INPUT_PATH)" in err
 
 
+@pytest.mark.parametrize("path", ["/", "//"])
+def test_root_path_exits_with_error(github_output_file, minimal_env, capfd, path):
+    """INPUT_PATH "/" normalizes to an empty path -> input error, exit 1, git never runs."""
+    minimal_env["INPUT_PATH"] = path
+    with patch.dict(os.environ, minimal_env, clear=False):
+        with patch("main.subprocess.run") as run:
+            with pytest.raises(SystemExit) as exc_info:
+                main_module.main()
+    assert exc_info.value.code == 1
+    run.assert_not_called()
+    assert read_output(github_output_file) == ""
+    out, err = capfd.readouterr()
+    assert "Invalid input: path" in err
+
+
 def test_missing_github_output_exits_with_error(capfd):
     """GITHUB_OUTPUT not set -> exit 1 and error on stderr."""
     env = {
@@ -88,7 +138,7 @@ def test_invalid_before_empty_exits_with_error(github_output_file):
 
 
 def test_invalid_before_all_zeros_outputs_true(github_output_file):
-    """INPUT_BEFORE is 0*40 -> cat-file + git diff run; mock so git diff returns file under path -> changed=true."""
+    """INPUT_BEFORE is 0*40 (no previous commit) -> changed=true without running git."""
     env = {
         "INPUT_PATH": "mon-dossier",
         "INPUT_BEFORE": "0" * 40,
@@ -96,15 +146,23 @@ def test_invalid_before_all_zeros_outputs_true(github_output_file):
         "GITHUB_OUTPUT": github_output_file,
         "GITHUB_WORKSPACE": str(Path(github_output_file).parent),
     }
-    success = MagicMock(returncode=0, stdout="", stderr="")
-    diff_with_change = MagicMock(returncode=0, stdout="mon-dossier/foo.txt\n", stderr="")
     with patch.dict(os.environ, env, clear=False):
-        # 1× git config safe.directory, 2× cat-file (before/after), 1× git diff
-        with patch("main.subprocess.run", side_effect=[success, success, success, diff_with_change]):
+        with patch("main.subprocess.run") as run:
             main_module.main()
+    run.assert_not_called()
     assert read_output(github_output_file) == "true"
 
 
+def test_same_before_and_after_outputs_false(github_output_file, minimal_env):
+    """before == after -> changed=false without running git."""
+    minimal_env["INPUT_AFTER"] = minimal_env["INPUT_BEFORE"]
+    with patch.dict(os.environ, minimal_env, clear=False):
+        with patch("main.subprocess.run") as run:
+            main_module.main()
+    run.assert_not_called()
+    assert read_output(github_output_file) == "false"
+
+
 def test_after_empty_exits_with_error(github_output_file, minimal_env):
     """INPUT_AFTER empty -> ValueError (after is required, no try/except in main for it)."""
     minimal_env["INPUT_AFTER"] = ""
@@ -116,10 +174,10 @@ def test_after_empty_exits_with_error(github_output_file, minimal_env):
 
 
 def test_file_under_path_outputs_true(github_output_file, minimal_env):
-    """git diff returns file under path -> changed=true."""
+    """git diff --quiet exits 1 (change under path) -> changed=true."""
     mock_result = MagicMock()
-    mock_result.returncode = 0
-    mock_result.stdout = "mon-dossier/foo.txt\n"
+    mock_result.returncode = 1
+    mock_result.stdout = ""
     mock_result.stderr = ""
     with patch.dict(os.environ, minimal_env, clear=False):
         with patch("main.subprocess.run", return_value=mock_result):
@@ -128,10 +186,10 @@ def test_file_under_path_outputs_true(github_output_file, minimal_env):
 
 
 def test_no_file_under_path_outputs_false(github_output_file, minimal_env):
-    """git diff returns only files outside path -> changed=false."""
+    """git diff --quiet exits 0 (nothing changed under path) -> changed=false."""
     mock_result = MagicMock()
     mock_result.returncode = 0
-    mock_result.stdout = "other/file.txt\n"
+    mock_result.stdout = ""
     mock_result.stderr = ""
     with patch.dict(os.environ, minimal_env, clear=False):
         with patch("main.subprocess.run", return_value=mock_result):
@@ -139,15 +197,22 @@ def test_no_file_under_path_outputs_false(github_output_file, minimal_env):
     assert read_output(github_output_file) == "false"
 
 
-def test_exact_path_match_outputs_true(github_output_file, minimal_env):
-    """git diff returns exactly the path as filename -> changed=true."""
+def test_diff_is_limited_to_path(github_output_file, minimal_env):
+    """git diff is run with a literal pathspec on path; only its exit code is used, output is not piped."""
     mock_result = MagicMock()
-    mock_result.returncode = 0
-    mock_result.stdout = "mon-dossier\n"
+    mock_result.returncode = 1
+    mock_result.stdout = ""
     mock_result.stderr = ""
     with patch.dict(os.environ, minimal_env, clear=False):
-        with patch("main.subprocess.run", return_value=mock_result):
+        with patch("main.subprocess.run", return_value=mock_result) as run:
             main_module.main()
+    diff_call = run.call_args_list[-1]
+    diff_args = diff_call.args[0]
+    assert diff_args[:3] == ["git", "--literal-pathspecs", "diff"]
+    assert "--exit-code" in diff_args
+    assert "--no-renames" in diff_args
+    assert diff_args[-2:] == ["--", "mon-dossier"]
+    assert not {"stdout", "stderr", "capture_output"} & diff_call.kwargs.keys()
     assert read_output(github_output_file) == "true"
 
 
@@ -155,33 +220,187 @@ def test_path_normalization_trailing_slash(github_output_file, minimal_env):
     """INPUT_PATH with trailing slash still matches path/foo -> changed=true."""
     minimal_env["INPUT_PATH"] = "mon-dossier/"
     mock_result = MagicMock()
-    mock_result.returncode = 0
-    mock_result.stdout = "mon-dossier/foo.txt\n"
+    mock_result.returncode = 1
+    mock_result.stdout = ""
     mock_result.stderr = ""
     with patch.dict(os.environ, minimal_env, clear=False):
-        with patch("main.subprocess.run", return_value=mock_result):
+        with patch("main.subprocess.run", return_value=mock_result) as run:
             main_module.main()
+    assert run.call_args_list[-1].args[0][-1] == "mon-dossier"
     assert read_output(github_output_file) == "true"
 
 
 def test_git_diff_failure_exits_with_error(github_output_file, minimal_env, capfd):
-    """git diff returncode != 0 -> exit 1, no changed= in output (cat-file must succeed first)."""
-    success = MagicMock(returncode=0, stdout="", stderr="")
-    failure = MagicMock(returncode=1, stdout="", stderr="fatal: bad revision")
+    """git diff returncode not 0/1 -> exit 1, no changed= in output (cat-file must succeed first)."""
+    cat_file = MagicMock(returncode=0, stdout="abc123 commit\ndef456 commit\n", stderr="")
+    failure = MagicMock(returncode=128, stdout=None, stderr=None)
     with patch.dict(os.environ, minimal_env, clear=False):
-        # 1× git config safe.directory, 2× cat-file (before/after), 1× git diff (failure)
-        with patch("main.subprocess.run", side_effect=[success, success, success, failure]):
+        # 1× cat-file --batch-check (before/after), 1× git diff (failure)
+        with patch("main.subprocess.run", side_effect=[cat_file, failure]):
             with pytest.raises(SystemExit) as exc_info:
                 main_module.main()
     assert exc_info.value.code == 1
     assert read_output(github_output_file) == ""
     out, err = capfd.readouterr()
-    assert "fatal" in err or "bad revision" in err or "git diff failed" in err
+    assert "git diff failed with exit code 128" in err
+
+
+def test_missing_commit_is_fetched(github_output_file, minimal_env):
+    """Both SHAs are checked by one cat-file call; only the missing one is fetched, by SHA."""
+    minimal_env["INPUT_BEFORE"] = "a" * 40
+    minimal_env["INPUT_AFTER"] = "b" * 40
+    success = MagicMock(returncode=0, stdout="", stderr="")
+    cat_file = MagicMock(returncode=0, stdout=f"{'a' * 40} missing\n{'b' * 40} commit\n", stderr="")
+    no_change = MagicMock(returncode=0, stdout="", stderr="")
+    with patch.dict(os.environ, minimal_env, clear=False):
+        # 1× cat-file --batch-check, 1× git fetch (before), 1× git diff
+        with patch("main.subprocess.run", side_effect=[cat_file, success, no_change]) as run:
+            main_module.main()
+    cat_file_call = run.call_args_list[0]
+    assert cat_file_call.args[0][:2] == ["git", "cat-file"]
+    assert cat_file_call.kwargs["input"] == f"{'a' * 40}\n{'b' * 40}\n"
+    assert run.call_args_list[1].args[0] == [
+        "git", "fetch", "--no-tags", "--filter=blob:none", "--depth=1", "origin", "a" * 40,
+    ]
+    assert read_output(github_output_file) == "false"
+
+
+def test_same_missing_commit_is_fetched_once():
+    """The same SHA given twice is checked and fetched only once."""
+    cat_file = MagicMock(returncode=0, stdout=f"{'a' * 40} missing\n", stderr="")
+    success = MagicMock(returncode=0, stdout="", stderr="")
+    # 1× cat-file --batch-check, 1× git fetch
+    with patch("main.subprocess.run", side_effect=[cat_file, success]) as run:
+        main_module._ensure_commits_exist("/workspace", ["a" * 40, "a" * 40])
+    assert run.call_args_list[0].kwargs["input"] == f"{'a' * 40}\n"
+
+
+def test_missing_relative_ref_deepens_head(github_output_file, minimal_env):
+    """Missing HEAD~1 -> fetch more history of the checked-out commit only (no branch refspec)."""
+    minimal_env["INPUT_BEFORE"] = "HEAD~1"
+    minimal_env["INPUT_AFTER"] = "b" * 40
+    success = MagicMock(returncode=0, stdout="", stderr="")
+    cat_file = MagicMock(returncode=0, stdout=f"HEAD~1 missing\n{'b' * 40} commit\n", stderr="")
+    rev_parse = MagicMock(returncode=0, stdout=f"{'b' * 40}\n", stderr="")
+    no_change = MagicMock(returncode=0, stdout="", stderr="")
+    with patch.dict(os.environ, minimal_env, clear=False):
+        # 1× cat-file, 1× rev-parse HEAD, 1× git fetch, 1× git diff
+        with patch("main.subprocess.run", side_effect=[cat_file, rev_parse, success, no_change]) as run:
+            main_module.main()
+    fetch_args = run.call_args_list[2].args[0]
+    assert fetch_args == [
+        "git", "fetch", "--no-tags", "--filter=blob:none", f"--depth={main_module.RELATIVE_REF_DEPTH}", "origin", "b" * 40,
+    ]
+    assert read_output(github_output_file) == "false"
+
+
+def test_write_output_appends(github_output_file):
+    """Output line is appended after what earlier steps wrote to GITHUB_OUTPUT."""
+    Path(github_output_file).write_text("other=1\n")
+    main_module._write_output(github_output_file, "true")
+    assert Path(github_output_file).read_text() == "other=1\nchanged=true\n"
+
+
+def test_safe_directory_written_once(tmp_path, monkeypatch):
+    """safe.directory is appended to the global config without git, and only once."""
+    config = tmp_path / "gitconfig"
+    config.write_text("[user]\n\tname = test")
+    monkeypatch.setenv("GIT_CONFIG_GLOBAL", str(config))
+    with patch("main.subprocess.run") as run:
+        main_module._ensure_safe_directory("/github/workspace")
+        main_module._ensure_safe_directory("/github/workspace")
+    run.assert_not_called()
+    values = subprocess.run(
+        ["git", "config", "--file", str(config), "--get-all", "safe.directory"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.splitlines()
+    assert values == ["/github/workspace"]
+
+
+def test_safe_directory_needing_quotes_uses_git(tmp_path):
+    """A workspace that would need quoting in the config file is delegated to git config."""
+    env = {"GIT_CONFIG_GLOBAL": str(tmp_path / "gitconfig")}
+    with patch("main.subprocess.run") as run:
+        main_module._ensure_safe_directory("/work#space", env)
+    assert run.call_args.args[0] == ["git", "config", "--global", "--add", "safe.directory", "/work#space"]
+
+
+@pytest.mark.parametrize("config_name", ["nodir/gitconfig", "."])
+def test_safe_directory_unwritable_config_falls_back_to_git(tmp_path, monkeypatch, config_name):
+    """Config dir missing or config path is a directory -> no crash, git config is tried instead."""
+    monkeypatch.setenv("GIT_CONFIG_GLOBAL", str(tmp_path / config_name))
+    with patch("main.subprocess.run") as run:
+        main_module._ensure_safe_directory("/github/workspace")
+    assert run.call_args.args[0] == ["git", "config", "--global", "--add", "safe.directory", "/github/workspace"]
+    assert run.call_args.kwargs["check"] is False
+
+
+def test_safe_directory_with_newline_uses_git(tmp_path, monkeypatch):
+    """A newline in the workspace would inject a config line -> delegated to git config."""
+    config = tmp_path / "gitconfig"
+    monkeypatch.setenv("GIT_CONFIG_GLOBAL", str(config))
+    with patch("main.subprocess.run") as run:
+        main_module._ensure_safe_directory("/work\n[core]")
+    run.assert_called_once()
+    assert not config.exists()
+
+
+def test_safe_directory_after_reset_is_added_again(tmp_path):
+    """An empty "directory =" clears earlier entries, so the workspace is appended again."""
+    config = tmp_path / "gitconfig"
+    config.write_text("[safe]\n\tdirectory = /github/workspace\n\tdirectory =\n")
+    with patch("main.subprocess.run") as run:
+        main_module._ensure_safe_directory("/github/workspace", {"GIT_CONFIG_GLOBAL": str(config)})
+    run.assert_not_called()
+    assert config.read_text().endswith("[safe]\n\tdirectory = /github/workspace\n")
+    assert config.read_text().count("directory = /github/workspace") == 2
+
+
+@pytest.mark.parametrize(
+    "ref, expected",
+    [("a" * 40, False), ("ABCDEF0123" * 4, False), ("HEAD~1", True), ("main", True), ("a" * 39, True), ("g" * 40, True),
+     ("0x" + "a" * 38, True), ("a" * 19 + " " + "a" * 20, True)],
+)
+def test_is_relative_ref(ref, expected):
+    """Only full hex SHAs are fetched directly."""
+    assert main_module._is_relative_ref(ref) is expected
 
 
 def test_git_not_found_exits_with_error(github_output_file, minimal_env):
-    """subprocess.run raises FileNotFoundError in _ensure_commit_exists -> exception propagates."""
+    """subprocess.run raises FileNotFoundError in _ensure_commits_exist -> exception propagates."""
     with patch.dict(os.environ, minimal_env, clear=False):
         with patch("main.subprocess.run", side_effect=FileNotFoundError):
             with pytest.raises(FileNotFoundError):
                 main_module.main()
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("mon-dossier", "true"),
+        ("mon-dossier/foo.txt", "true"),
+        ("./mon-dossier", "true"),
+        ("mon-dossier//foo.txt", "true"),
+        (".", "true"),
+        ("other", "false"),
+        ("mon", "false"),
+        ("absent", "false"),
+    ],
+)
+def test_real_repository(tmp_path, git_repo, path, expected):
+    """main() against a real repository: git diff decides from the pathspec."""
+    workspace, before, after = git_repo
+    github_output = str(tmp_path / "output")
+    env = {
+        "INPUT_PATH": path,
+        "INPUT_BEFORE": before,
+        "INPUT_AFTER": after,
+        "GITHUB_OUTPUT": github_output,
+        "GITHUB_WORKSPACE": workspace,
+        "GIT_CONFIG_GLOBAL": str(tmp_path / "gitconfig"),
+    }
+    with patch.dict(os.environ, env, clear=False):
+        main_module.main()
+    assert read_output(github_output) == expected